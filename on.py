@@ -3,113 +3,66 @@
 on.py — power ON the Sony VPL-FH30 via its web interface.
 
 Logic:
-  1. Query http://<IP>/info_data.htm  (no auth)
+  1. Query http://<IP>/info_data.htm  (no auth, one keep-alive connection)
   2. Parse JS array info_status_value
   3. If status is OFF/STANDBY → send GET to http://<IP>/custom/01
   4. Poll until status becomes ON / STARTUP / COOLING / TIMEOUT
+
+Usage: on.py [--skip-check] [IP ...]   (several IPs are driven concurrently; exit 1 if any times out)
 """
 from __future__ import annotations
+import argparse
 import sys
-import time
-import urllib.request
-import urllib.error
-import re
-
-IP_DEFAULT = "192.168.250.1"
-STATUS_URL_TEMPLATE = "http://{ip}/info_data.htm"
-TOGGLE_URL_TEMPLATE = "http://{ip}/custom/01"
-TIMEOUT_SEC = 5.0
-POLL_INTERVAL = 3
-MAX_WAIT = 90  # seconds total wait for ON confirmation
-
-STATUS_RE = re.compile(r"var\s+info_status_value\s*=\s*\[([^\]]*)\]", re.IGNORECASE)
-QUOTED_ITEM_RE = re.compile(r"'([^']*)'")
-
-
-def fetch(url: str, timeout: float) -> str:
-    req = urllib.request.Request(url, headers={"User-Agent": "fh30-on/1.0"})
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read()
-    try:
-        return raw.decode("utf-8")
-    except UnicodeDecodeError:
-        return raw.decode("latin-1", errors="replace")
+import http.client
 
+from sonyfh30 import (
+    IP_DEFAULT, TIMEOUT_SEC, current_status, resolve, run_all, toggle_power, wait_for, write_cache,
+)
 
-def parse_info_status(html: str) -> str | None:
-    """Return first element of info_status_value JS array, or None."""
-    compact = html.replace("\r", "").replace("\n", "")
-    m = STATUS_RE.search(compact)
-    if not m:
-        return None
-    array_content = m.group(1)
-    items = QUOTED_ITEM_RE.findall(array_content)
-    return items[0] if items else None
+POLL_INTERVAL = 3
+MAX_WAIT = 90  # seconds total wait for ON confirmation
 
 
-def normalize_status(s: str | None) -> str:
+def power_on(ip: str, tag: str = "", skip_check: bool = False) -> bool:
     """
-    Normalize projector-reported status to a small set:
-    ON, OFF, COOLING, or UNKNOWN.
+    Drive one projector to ON; return True once it reports ON.
+    With skip_check the initial status query is skipped and the toggle is sent
+    straight away (if the projector was already ON, this turns it OFF).
     """
-    if s is None:
-        return "UNKNOWN"
-    up = s.strip().upper()
-    # Treat STARTUP states as ON
-    if up in ("ON", "STARTUP", "STARTUP1", "STARTUP2", "POWER ON"):
-        return "ON"
-    if up in ("OFF", "STANDBY"):
-        return "OFF"
-    if "COOL" in up or "WARM" in up:
-        return "COOLING"
-    return "UNKNOWN"
-
-
-def get_status(ip: str) -> str:
-    url = STATUS_URL_TEMPLATE.format(ip=ip)
-    try:
-        html = fetch(url, TIMEOUT_SEC)
-    except Exception as e:
-        print(f"[warn] status fetch failed: {e}")
-        return "UNKNOWN"
-    s = parse_info_status(html)
-    return normalize_status(s)
-
-
-def toggle_power(ip: str):
-    url = TOGGLE_URL_TEMPLATE.format(ip=ip)
-    try:
-        urllib.request.urlopen(url, timeout=TIMEOUT_SEC).read()
-        print(f"[info] Sent toggle command to {url}")
-    except Exception as e:
-        print(f"[warn] toggle failed: {e}")
+    # One keep-alive connection to the pre-resolved IP for the check, toggle and polls.
+    conn = http.client.HTTPConnection(resolve(ip), timeout=TIMEOUT_SEC)
 
+    if not skip_check:
+        print(f"{tag}[info] Checking projector {ip} status...")
+        status = current_status(conn, ip, tag)
+        print(f"{tag}[info] Current status: {status}")
 
-def main():
-    ip = sys.argv[1] if len(sys.argv) > 1 else IP_DEFAULT
-    print(f"[info] Checking projector {ip} status...")
+        if status == "ON":
+            print(f"{tag}✅ Projector already ON or starting up.")
+            return True
 
-    status = get_status(ip)
-    print(f"[info] Current status: {status}")
+    print(f"{tag}[info] Sending toggle to power ON...")
+    toggle_power(conn, tag)
+    write_cache(ip, None)  # whatever was cached is stale now
 
-    if status == "ON":
-        print("✅ Projector already ON or starting up.")
-        sys.exit(0)
+    if wait_for(conn, ip, "ON", POLL_INTERVAL, MAX_WAIT, tag):
+        print(f"{tag}✅ Projector is now ON (or in STARTUP).")
+        return True
 
-    print("[info] Sending toggle to power ON...")
-    toggle_power(ip)
+    print(f"{tag}⚠️ Timeout waiting for projector to power ON.")
+    return False
 
-    start = time.time()
-    while time.time() - start < MAX_WAIT:
-        time.sleep(POLL_INTERVAL)
-        status = get_status(ip)
-        print(f"[poll] Status: {status}")
-        if status == "ON":
-            print("✅ Projector is now ON (or in STARTUP).")
-            sys.exit(0)
 
-    print("⚠️ Timeout waiting for projector to power ON.")
-    sys.exit(1)
+def main():
+    p = argparse.ArgumentParser(description="Power ON Sony VPL-FH30 projectors.")
+    p.add_argument("ips", nargs="*", metavar="IP", help=f"Projector IP(s) (default: {IP_DEFAULT})")
+    p.add_argument("--skip-check", "--force", action="store_true",
+                   help="Send the toggle without querying status first (saves a round-trip; "
+                        "turns the projector OFF if it was already ON)")
+    args = p.parse_args()
+
+    ok = run_all(lambda ip, tag: power_on(ip, tag, args.skip_check), args.ips or [IP_DEFAULT])
+    sys.exit(0 if all(ok) else 1)
 
 
 if __name__ == "__main__":
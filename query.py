@@ -5,101 +5,120 @@ query.py — read Sony VPL-FH30 power status from its web UI.
 Defaults:
   IP:       192.168.250.1
   Status:   http://<IP>/info_data.htm  (no auth)
+  Cache:    a status seen by on/off/query in the last 2 s is reused (skipped with --url)
 
 Exit codes:
   0 = ON
   2 = OFF (treats STANDBY as OFF)
   3 = COOLING / WARMUP
   4 = UNKNOWN / parse or network error
+
+Library use (no process exit): `from query import query; status, code = query(ip)`
 """
 from __future__ import annotations
 
 import argparse
 import sys
-import urllib.request
-import urllib.error
-import re
-
-STATUS_RE = re.compile(r"var\s+info_status_value\s*=\s*\[([^\]]*)\]", re.IGNORECASE)
-QUOTED_ITEM_RE = re.compile(r"'([^']*)'")  # pull 'STANDBY' etc.
-
-def fetch(url: str, timeout: float) -> str:
-    req = urllib.request.Request(url, headers={"User-Agent": "fh30-query/1.0"})
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read()
-    # the page is tiny; treat as ASCII/latin-1 if charset is missing
-    try:
-        return raw.decode("utf-8", errors="strict")
-    except UnicodeDecodeError:
-        return raw.decode("latin-1", errors="replace")
-
-def parse_info_status(html: str) -> tuple[str | None, list[str]]:
-    """
-    Returns (status_first_element, full_array_items).
-    status_first_element is the first string in info_status_value JS array, or None if not found.
-    """
-    # Collapse newlines (the regex would work either way, but this helps when printing snippets)
-    compact = html.replace("\r", "").replace("\n", "")
-    m = STATUS_RE.search(compact)
-    if not m:
-        return None, []
-    array_content = m.group(1)
-    items = QUOTED_ITEM_RE.findall(array_content)
-    first = items[0] if items else None
-    return first, items
-
-def normalize_status(s: str | None) -> str:
-    if s is None:
-        return "UNKNOWN"
-    up = s.strip().upper()
-    if up in ("ON", "STARTUP", "STARTUP1", "STARTUP2", "POWER ON"):
-        return "ON"
-    if up in ("OFF", "STANDBY"):
-        return "OFF"
-    if "COOL" in up or "WARM" in up:
-        return "COOLING"
-    return "UNKNOWN"
+import threading
+import http.client
+from urllib.parse import urlsplit
 
-def main():
-    p = argparse.ArgumentParser(description="Query Sony VPL-FH30 power status.")
-    p.add_argument("--ip", default="192.168.250.1", help="Projector IP (default: 192.168.250.1)")
-    p.add_argument("--url", help="Override status URL (default: http://<IP>/info_data.htm)")
-    p.add_argument("--timeout", type=float, default=5.0, help="HTTP timeout seconds (default: 5.0)")
-    p.add_argument("--debug", action="store_true", help="Print parsing details to stderr")
-    args = p.parse_args()
+from sonyfh30 import (
+    CACHE_MAX_AGE, IP_DEFAULT, STATUS_PATH, STATUS_RE, TIMEOUT_SEC,
+    fetch, normalize_status, parse_info_items, parse_info_status, read_cache, resolve, write_cache,
+)
+
+# Exit codes as agreed; anything else (UNKNOWN) is 4
+EXIT_CODES = {"ON": 0, "OFF": 2, "COOLING": 3}
 
-    url = args.url or f"http://{args.ip}/info_data.htm"
+# One keep-alive connection per projector (or --url target), reused across
+# in-process query() calls; no urllib opener/proxy machinery per request.
+# Each connection has its own lock so threaded callers never interleave
+# requests on one socket; _conns_lock only guards the dict itself.
+_conns: dict[str, tuple[http.client.HTTPConnection, threading.Lock]] = {}
+_conns_lock = threading.Lock()
 
-    try:
-        html = fetch(url, args.timeout)
-    except (urllib.error.URLError, urllib.error.HTTPError) as e:
-        print("UNKNOWN")
-        if args.debug:
-            print(f"[debug] fetch error: {e}", file=sys.stderr)
-        sys.exit(4)
+def _connection(ip: str, url: str | None,
+                timeout: float) -> tuple[http.client.HTTPConnection, threading.Lock, str]:
+    """Returns (pinned connection, its lock, request path) for ip or the override url."""
+    if url:
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    else:
+        path = STATUS_PATH
+    key = url or ip
+    entry = _conns.get(key)
+    if entry is None:
+        if url:
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.netloc, timeout=timeout)
+        else:
+            conn = http.client.HTTPConnection(resolve(ip), timeout=timeout)
+        with _conns_lock:
+            # another thread may have won the race; use its connection
+            entry = _conns.setdefault(key, (conn, threading.Lock()))
+    return entry[0], entry[1], path
 
-    first, items = parse_info_status(html)
+def query(ip: str = IP_DEFAULT, timeout: float = TIMEOUT_SEC, url: str | None = None,
+          debug: bool = False) -> tuple[str, int]:
+    """
+    Returns (status, exit_code) for the projector at ip, without exiting.
+    Lets a long-running caller poll in-process: `from query import query`.
+    Thread-safe: concurrent calls for the same projector take turns on its
+    connection.
+    """
+    # A status persisted by on/off/query moments ago is as good as a fresh GET.
+    cached, age = read_cache(ip) if not url else (None, float("inf"))
+    if age < CACHE_MAX_AGE:
+        if debug:
+            print(f"[debug] using status cached {age:.1f}s ago", file=sys.stderr)
+        return cached, EXIT_CODES[cached]
+
+    cache_key = None if url else ip
+    conn, lock, path = _connection(ip, url, timeout)
+    url = url or f"http://{conn.host}:{conn.port}{path}"
+    with lock:
+        if conn.timeout != timeout:
+            conn.close()  # the new timeout applies from the next connect
+            conn.timeout = timeout
+        try:
+            raw = fetch(conn, path)
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            if debug:
+                print(f"[debug] fetch error: {e}", file=sys.stderr)
+            return "UNKNOWN", 4
+
+    first = parse_info_status(raw)
     status = normalize_status(first)
+    if cache_key:
+        write_cache(cache_key, status)
 
     # Optional debug info
-    if args.debug:
+    if debug:
         print(f"[debug] url={url}", file=sys.stderr)
-        snippet = STATUS_RE.search(html.replace("\r", "").replace("\n", ""))
+        # Collapse newlines only here, so the printed snippet stays on one line
+        compact = raw.replace(b"\r", b"").replace(b"\n", b"")
+        snippet = STATUS_RE.search(compact)
         if snippet:
-            print(f"[debug] matched: {snippet.group(0)[:300]}...", file=sys.stderr)
-        print(f"[debug] items={items!r}", file=sys.stderr)
+            print(f"[debug] matched: {snippet.group(0)[:300].decode('ascii', errors='replace')}...", file=sys.stderr)
+        # the full array is only needed for this listing
+        print(f"[debug] items={parse_info_items(raw)!r}", file=sys.stderr)
         print(f"[debug] first='{first}'  -> normalized='{status}'", file=sys.stderr)
 
-    print(status)
+    return status, EXIT_CODES.get(status, 4)
+
+def main():
+    p = argparse.ArgumentParser(description="Query Sony VPL-FH30 power status.")
+    p.add_argument("--ip", default=IP_DEFAULT, help=f"Projector IP (default: {IP_DEFAULT})")
+    p.add_argument("--url", help="Override status URL (default: http://<IP>/info_data.htm)")
+    p.add_argument("--timeout", type=float, default=TIMEOUT_SEC, help=f"HTTP timeout seconds (default: {TIMEOUT_SEC})")
+    p.add_argument("--debug", action="store_true", help="Print parsing details to stderr")
+    args = p.parse_args()
 
-    # Exit codes as agreed
-    if status == "ON":
-        sys.exit(0)
-    if status == "OFF":
-        sys.exit(2)
-    if status == "COOLING":
-        sys.exit(3)
-    sys.exit(4)
+    status, code = query(args.ip, args.timeout, url=args.url, debug=args.debug)
+    print(status)
+    sys.exit(code)
 
 if __name__ == "__main__":
     main()
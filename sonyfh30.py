@@ -0,0 +1,249 @@
+"""
+sonyfh30.py — shared helpers for talking to a Sony VPL-FH30 web interface.
+
+Used by on.py, off.py and query.py so the status regexes are compiled once per
+process and the fetch/parse/normalize logic lives in one place.
+"""
+from __future__ import annotations
+import functools
+import http.client
+import os
+import re
+import socket
+import stat
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+IP_DEFAULT = "192.168.250.1"
+STATUS_PATH = "/info_data.htm"
+TOGGLE_PATH = "/custom/01"
+REQUEST_HEADERS = {"User-Agent": "fh30/1.0", "Connection": "keep-alive"}  # built once, sent on every poll
+TIMEOUT_SEC = 5.0
+POLL_INITIAL = 0.5  # first poll delay; doubles up to the caller's poll interval
+CACHE_MAX_AGE = 2.0  # seconds a status persisted by a previous run is trusted
+
+# All patterns are matched against the raw bytes so the page body is never
+# decoded as a whole.
+STATUS_RE = re.compile(rb"\bvar\s+info_status_value\s*=\s*\[([^\]]*)\]", re.IGNORECASE)
+QUOTED_ITEM_RE = re.compile(rb"'([^']*)'")  # pull 'STANDBY' etc.
+
+# on/off only need the first element of info_status_value; stop there.
+FIRST_ITEM_RE = re.compile(rb"\bvar\s+info_status_value\s*=\s*\[\s*'([^']*)'", re.IGNORECASE)
+STATUS_ANCHOR = b"var info_status_value"  # fast-path literal; FIRST_ITEM_RE is the fallback
+
+# Exact raw status -> normalized status; STARTUP states count as ON.
+_STATUS_MAP = {
+    "ON": "ON",
+    "STARTUP": "ON",
+    "STARTUP1": "ON",
+    "STARTUP2": "ON",
+    "POWER ON": "ON",
+    "OFF": "OFF",
+    "STANDBY": "OFF",
+}
+
+
+def resolve(host: str) -> str:
+    """
+    Resolve host (optionally host:port) to a literal IPv4 address once, so
+    reconnects and polls never go through getaddrinfo again. Unresolvable
+    names are returned unchanged and fail later with the usual error.
+    """
+    name, sep, port = host.rpartition(":")
+    if not (sep and port.isdigit()):
+        name, sep, port = host, "", ""
+    try:
+        return socket.gethostbyname(name) + sep + port
+    except OSError:
+        return host
+
+
+def _get(conn: http.client.HTTPConnection, path: str) -> bytes:
+    conn.request("GET", path, headers=REQUEST_HEADERS)
+    resp = conn.getresponse()
+    raw = resp.read()
+    if resp.status >= 400:
+        raise http.client.HTTPException(f"HTTP {resp.status} {resp.reason}")
+    return raw
+
+
+def fetch(conn: http.client.HTTPConnection, path: str, retry: bool = True) -> bytes:
+    if not retry:
+        return _get(conn, path)
+    try:
+        return _get(conn, path)
+    except (ConnectionError, http.client.BadStatusLine):
+        # The projector may drop an idle keep-alive socket between polls (reset,
+        # broken pipe or an empty status line); reconnect once.
+        conn.close()
+        return _get(conn, path)
+
+
+def parse_info_status(raw: bytes, _search=FIRST_ITEM_RE.search) -> str | None:
+    """Return first element of info_status_value JS array, or None."""
+    # Fast path for the page's usual `var info_status_value = ['...'`; must agree
+    # with FIRST_ITEM_RE (see test_sonyfh30.py), anything unusual falls through.
+    i = raw.find(STATUS_ANCHOR)
+    if i >= 0 and (i == 0 or not (raw[i - 1:i].isalnum() or raw[i - 1:i] in b"_$")):
+        j = raw.find(b"'", i)
+        k = raw.find(b"'", j + 1) if j >= 0 else -1
+        if k >= 0 and b"".join(raw[i + len(STATUS_ANCHOR):j].split()) == b"=[":
+            return raw[j + 1:k].decode("ascii", errors="replace")
+    # Unexpected spacing/casing: fall back to the tolerant regex.
+    m = _search(raw)
+    if not m:
+        return None
+    return m.group(1).decode("ascii", errors="replace")
+
+
+def parse_info_items(raw: bytes, _search=STATUS_RE.search, _find=QUOTED_ITEM_RE.findall) -> list[str]:
+    """Return every element of the info_status_value JS array ([] if not found)."""
+    m = _search(raw)
+    if not m:
+        return []
+    # status strings are plain ASCII; decode just these few bytes
+    return [item.decode("ascii", errors="replace") for item in _find(m.group(1))]
+
+
+@functools.lru_cache(maxsize=32)
+def normalize_status(s: str | None) -> str:
+    """
+    Normalize projector-reported status to a small set:
+    ON, OFF, COOLING, or UNKNOWN.
+    Cached: the projector only ever reports a handful of distinct strings.
+    """
+    if s is None:
+        return "UNKNOWN"
+    up = s.strip().upper()
+    r = _STATUS_MAP.get(up)
+    if r:
+        return r
+    if "COOL" in up or "WARM" in up:
+        return "COOLING"
+    return "UNKNOWN"
+
+
+def get_status(conn: http.client.HTTPConnection, tag: str = "") -> str:
+    try:
+        raw = fetch(conn, STATUS_PATH)
+    except Exception as e:
+        conn.close()
+        print(f"{tag}[warn] status fetch failed: {e}")
+        return "UNKNOWN"
+    s = parse_info_status(raw)
+    return normalize_status(s)
+
+
+def toggle_power(conn: http.client.HTTPConnection, tag: str = ""):
+    # The toggle is not idempotent: if the projector acts on it and then drops
+    # the socket, a retry would flip it straight back. Send it once, on a fresh
+    # socket so a stale keep-alive connection can't fail it either.
+    conn.close()
+    try:
+        fetch(conn, TOGGLE_PATH, retry=False)
+        print(f"{tag}[info] Sent toggle command to http://{conn.host}:{conn.port}{TOGGLE_PATH}")
+    except Exception as e:
+        conn.close()
+        print(f"{tag}[warn] toggle failed: {e}")
+
+
+def _cache_path(ip: str) -> str:
+    safe = re.sub(r"[^\w.-]", "_", ip)  # host:port → host_port
+    return os.path.join(tempfile.gettempdir(), f"fh30-{safe}.status")
+
+
+def read_cache(ip: str) -> tuple[str | None, float]:
+    """
+    Return (status, age_seconds) last persisted for ip, or (None, inf).
+    Lets chained invocations (on → query → off) skip a round-trip.
+    """
+    path = _cache_path(ip)
+    try:
+        # The temp dir is shared: don't follow a planted symlink or block on a
+        # planted FIFO, and only trust a regular file this user wrote (checked
+        # on the opened fd, not the name).
+        flags = os.O_RDONLY | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_NOFOLLOW", 0)
+        fd = os.open(path, flags)
+        with os.fdopen(fd, encoding="ascii") as f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                return None, float("inf")
+            if hasattr(os, "getuid") and st.st_uid != os.getuid():
+                return None, float("inf")
+            age = time.time() - st.st_mtime
+            status = f.read().strip()
+    except (OSError, ValueError):
+        return None, float("inf")
+    if status not in ("ON", "OFF", "COOLING"):
+        return None, float("inf")
+    return status, age
+
+
+def write_cache(ip: str, status: str | None):
+    """Persist status for ip; None/UNKNOWN drops the entry (e.g. right after a toggle)."""
+    path = _cache_path(ip)
+    try:
+        if status is None or status == "UNKNOWN":
+            os.remove(path)
+            return
+        # mkstemp creates a fresh, unpredictable, owner-only file (O_EXCL), so a
+        # planted symlink can't redirect the write.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix="fh30-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="ascii") as f:
+                f.write(status)
+            os.replace(tmp, path)
+        except OSError:
+            os.remove(tmp)
+            raise
+    except OSError:
+        pass  # the cache is only an optimization
+
+
+def current_status(conn: http.client.HTTPConnection, ip: str, tag: str = "") -> str:
+    """Status from a cache entry under CACHE_MAX_AGE, else from one GET."""
+    status, age = read_cache(ip)
+    if age < CACHE_MAX_AGE:
+        print(f"{tag}[info] Using status cached {age:.1f}s ago")
+        return status
+    status = get_status(conn, tag)
+    write_cache(ip, status)
+    return status
+
+
+def wait_for(conn: http.client.HTTPConnection, ip: str, target: str, interval: float,
+             max_wait: float, tag: str = "") -> bool:
+    """Poll until the status is target; return False after max_wait seconds."""
+    start = time.monotonic()
+    delay = POLL_INITIAL
+    elapsed = 0.0
+    while time.monotonic() - start < max_wait:
+        time.sleep(max(0.0, delay - elapsed))  # steady period even if requests are slow
+        t0 = time.monotonic()
+        status = get_status(conn, tag)
+        elapsed = time.monotonic() - t0
+        write_cache(ip, status)
+        print(f"{tag}[poll] Status: {status}")
+        if status == target:
+            return True
+        delay = min(delay * 2, interval)
+    return False
+
+
+def run_all(drive: Callable[[str, str], bool], ips: list[str]) -> list[bool]:
+    """Run drive(ip, tag) for every projector, one worker thread each."""
+    # Drive each physical projector once; a duplicate would send a second toggle.
+    unique: dict[str, str] = {}
+    for ip in ips:
+        addr = resolve(ip)
+        if addr in unique:
+            print(f"[info] Skipping {ip}: same projector as {unique[addr]}")
+        else:
+            unique[addr] = ip
+    ips = list(unique.values())
+    if len(ips) == 1:
+        return [drive(ips[0], "")]
+    with ThreadPoolExecutor(max_workers=len(ips)) as pool:
+        return list(pool.map(lambda ip: drive(ip, f"[{ip}] "), ips))
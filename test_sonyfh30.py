@@ -0,0 +1,42 @@
+"""
+test_sonyfh30.py — checks parse_info_status's find() fast path against FIRST_ITEM_RE.
+
+Run with: python -m pytest -q  (or python -m unittest test_sonyfh30)
+"""
+import unittest
+
+from sonyfh30 import FIRST_ITEM_RE, parse_info_status
+
+PAGES = {
+    "plain": b"var info_status_value = ['ON','x'];",
+    "prefix_name": b"var prev_info_status_value = ['ON'];\nvar info_status_value = ['STANDBY'];",
+    "suffix_name": b"var info_status_value2 = ['ON'];var info_status_value = ['COOLING1'];",
+    "identifier_before_var": b"myvar info_status_value = ['ON'];\nvar info_status_value = ['OFF'];",
+    "mixed_case": b"var  INFO_STATUS_VALUE=[ 'ON' ];",
+    "multi_line": b"var info_status_value = [\r\n  'STARTUP1',\r\n];",
+    "empty_array": b"var info_status_value = [];\nvar other = 'x';",
+    "missing": b"<html><body>no status here</body></html>",
+}
+
+
+def regex_first(raw: bytes):
+    m = FIRST_ITEM_RE.search(raw)
+    return m.group(1).decode("ascii", errors="replace") if m else None
+
+
+class ParseInfoStatusTest(unittest.TestCase):
+    def test_fast_path_agrees_with_regex(self):
+        for name, raw in PAGES.items():
+            with self.subTest(name):
+                self.assertEqual(parse_info_status(raw), regex_first(raw))
+
+    def test_expected_values(self):
+        self.assertEqual(parse_info_status(PAGES["prefix_name"]), "STANDBY")
+        self.assertEqual(parse_info_status(PAGES["suffix_name"]), "COOLING1")
+        self.assertEqual(parse_info_status(PAGES["identifier_before_var"]), "OFF")
+        self.assertEqual(parse_info_status(PAGES["multi_line"]), "STARTUP1")
+        self.assertIsNone(parse_info_status(PAGES["empty_array"]))
+
+
+if __name__ == "__main__":
+    unittest.main()